@@ -5,11 +5,13 @@ from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import pandas as pd
-from typing import Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 from app.models import QueryRequest, QueryResponse, FileUploadResponse
-from app.utils.table_utils import save_uploaded_csv, load_table_from_csv, truncate_table
+from app.utils.table_utils import save_uploaded_csv, load_table_from_csv, truncate_table, content_path
+from app.utils.lru_cache import LRUCache
 from app.services.query_service import process_query
+from app.services.model_cascade import get_metrics
 
 # Initialize FastAPI app
 app = FastAPI(title="Table Query System")
@@ -22,10 +24,33 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 UPLOAD_DIR = os.path.join(os.getcwd(), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# In-memory storage for uploaded files
+# In-memory storage for uploaded files, mapping file_id to content hash
 # In a production app, this would be replaced with a database
 file_storage: Dict[str, str] = {}
 
+# Derived artifacts keyed by content hash, shared across identical uploads.
+# Bounded so tables of old uploads are evicted instead of kept forever
+TABLE_CACHE_SIZE = int(os.getenv("TABLE_CACHE_SIZE", "16"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "10000"))
+table_cache: Dict[str, pd.DataFrame] = LRUCache(TABLE_CACHE_SIZE)
+answer_cache: Dict[Tuple[str, str, Optional[Tuple[int, ...]]], Dict[str, Any]] = LRUCache(ANSWER_CACHE_SIZE)
+
+# Conversational sessions, mapping session_id to the file and row indices
+# of the previous answer so follow-up questions can be narrowed to them.
+# Bounded so client-chosen session ids cannot grow it without limit
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1000"))
+session_storage: Dict[str, Dict[str, Any]] = LRUCache(SESSION_CACHE_SIZE)
+
+def get_table(content_hash: str) -> Optional[pd.DataFrame]:
+    """Return the parsed table for a content hash, loading it on first use."""
+    df = table_cache.get(content_hash)
+    if df is None:
+        df = load_table_from_csv(content_path(UPLOAD_DIR, content_hash))
+        if df is None:
+            return None
+        table_cache[content_hash] = df
+    return df
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Render the main page."""
@@ -41,7 +66,7 @@ async def upload_file(file: UploadFile = File(...)):
         )
     
     # Save the uploaded file
-    success, message, file_path = save_uploaded_csv(file, UPLOAD_DIR)
+    success, message, content_hash = save_uploaded_csv(file, UPLOAD_DIR)
     if not success:
         return JSONResponse(
             status_code=400,
@@ -50,11 +75,13 @@ async def upload_file(file: UploadFile = File(...)):
     
     # Generate a unique ID for this file
     file_id = str(uuid.uuid4())
-    file_storage[file_id] = file_path
+    file_storage[file_id] = content_hash
     
     # Generate preview data
     try:
-        df = load_table_from_csv(file_path)
+        df = get_table(content_hash)
+        if df is None:
+            raise ValueError("Could not parse CSV file.")
         truncated_df = truncate_table(df, max_rows=5)
         
         preview = {
@@ -92,21 +119,51 @@ async def query_table(query_request: QueryRequest):
             }
         )
     
-    # Load the table
-    file_path = file_storage[query_request.file_id]
-    table = load_table_from_csv(file_path)
-    if table is None:
-        return JSONResponse(
-            status_code=500,
-            content={
-                "success": False, 
-                "message": "Error loading table from file."
-            }
-        )
+    # Follow-ups only look at the rows of the previous answer in the session
+    row_indices = None
+    if query_request.follow_up:
+        session = session_storage.get(query_request.session_id) if query_request.session_id else None
+        if not session or session["file_id"] != query_request.file_id:
+            return JSONResponse(
+                status_code=400,
+                content={
+                    "success": False,
+                    "message": "No previous answer to follow up on. Ask the question without follow-up first."
+                }
+            )
+        row_indices = session["row_indices"]
     
-    # Process the query
-    result = process_query(query_request.query, table)
-    return result
+    # Answers are deterministic for a given table, row subset and query
+    content_hash = file_storage[query_request.file_id]
+    cache_key = (content_hash, query_request.query, tuple(row_indices) if row_indices else None)
+    result = answer_cache.get(cache_key)
+    
+    if result is None:
+        # Load the table
+        table = get_table(content_hash)
+        if table is None:
+            return JSONResponse(
+                status_code=500,
+                content={
+                    "success": False, 
+                    "message": "Error loading table from file."
+                }
+            )
+        if row_indices:
+            table = table.loc[row_indices]
+        
+        # Process the query
+        result = process_query(query_request.query, table)
+        if result.get("success"):
+            answer_cache[cache_key] = result
+    
+    # Remember the answer rows for the next follow-up in this session
+    if query_request.session_id and result.get("success") and result.get("row_indices"):
+        session_storage[query_request.session_id] = {
+            "file_id": query_request.file_id,
+            "row_indices": result["row_indices"]
+        }
+    return {**result, "narrowed": row_indices is not None}
 
 @app.get("/api/files/{file_id}/preview")
 async def get_file_preview(file_id: str):
@@ -114,8 +171,7 @@ async def get_file_preview(file_id: str):
     if file_id not in file_storage:
         raise HTTPException(status_code=404, detail="File not found")
     
-    file_path = file_storage[file_id]
-    df = load_table_from_csv(file_path)
+    df = get_table(file_storage[file_id])
     if df is None:
         raise HTTPException(status_code=500, detail="Error loading file")
     
@@ -131,6 +187,11 @@ async def get_file_preview(file_id: str):
         }
     }
 
+@app.get("/api/metrics/cascade")
+async def get_cascade_metrics():
+    """Get model cascade escalation metrics."""
+    return get_metrics()
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize resources on startup."""
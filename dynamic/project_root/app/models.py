@@ -4,12 +4,18 @@ from typing import Optional, List, Dict, Any, Union
 class QueryRequest(BaseModel):
     query: str
     file_id: str
+    session_id: Optional[str] = None
+    follow_up: bool = False
 
 class QueryResponse(BaseModel):
     success: bool
     message: Optional[str] = None
     result_type: Optional[str] = None
     result: Optional[Union[List[str], Dict[str, Any]]] = None
+    row_indices: Optional[List[int]] = None
+    confidence: Optional[float] = None
+    model: Optional[str] = None
+    narrowed: Optional[bool] = None
 
 class FileUploadResponse(BaseModel):
     success: bool
@@ -0,0 +1,136 @@
+import os
+import logging
+import torch
+from transformers import TapasTokenizer, TapasForQuestionAnswering
+from typing import Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Checkpoints tried in order, cheapest first; an empty setting uses the default
+DEFAULT_CASCADE_MODELS = ["google/tapas-small-finetuned-wtq", "google/tapas-base-finetuned-wtq"]
+CASCADE_MODELS = [
+    name.strip() for name in os.getenv("TAPAS_CASCADE_MODELS", "").split(",") if name.strip()
+] or DEFAULT_CASCADE_MODELS
+
+# Answers below this confidence are escalated to the next checkpoint
+CONFIDENCE_THRESHOLD = float(os.getenv("TAPAS_CONFIDENCE_THRESHOLD", "0.7"))
+
+MAX_TOKENS = 512
+
+# Loaded checkpoints, keyed by model name
+_models: Dict[str, Tuple[TapasTokenizer, TapasForQuestionAnswering]] = {}
+
+# Escalation metrics since startup
+_metrics: Dict[str, Any] = {
+    "queries": 0,
+    "escalations": 0,
+    "answered_by": {name: 0 for name in CASCADE_MODELS}
+}
+
+class TokenLimitError(ValueError):
+    """Raised when a table and query do not fit in the model input."""
+
+def _load_model(model_name: str) -> Tuple[TapasTokenizer, TapasForQuestionAnswering]:
+    """Load a checkpoint on first use so larger models cost nothing until needed."""
+    if model_name not in _models:
+        logger.info(f"Loading TAPAS model: {model_name}")
+        tokenizer = TapasTokenizer.from_pretrained(model_name)
+        model = TapasForQuestionAnswering.from_pretrained(model_name)
+        model.eval()
+        _models[model_name] = (tokenizer, model)
+    return _models[model_name]
+
+def _confidence(inputs, outputs, index: int) -> float:
+    """
+    Score a prediction from its cell-selection and aggregation logits.
+    
+    The cell score is the mean probability of the selected table tokens and
+    the aggregation score is the probability of the chosen operator. A
+    prediction that selects no cells scores zero.
+    """
+    token_type_ids = inputs["token_type_ids"][index]
+    # Table cell tokens have segment id 1 and a row id past the header row
+    cell_mask = (token_type_ids[:, 0] == 1) & (token_type_ids[:, 2] > 0) & (inputs["attention_mask"][index] == 1)
+    
+    probs = torch.sigmoid(outputs.logits[index])[cell_mask]
+    selected = probs[probs > 0.5]
+    if selected.numel() == 0:
+        return 0.0
+    
+    aggregation_probs = torch.softmax(outputs.logits_aggregation[index], dim=-1)
+    return float(selected.mean() * aggregation_probs.max())
+
+def predict(table, queries: List[str]) -> List[Dict[str, Any]]:
+    """
+    Answer queries against a table, escalating low-confidence answers.
+    
+    Every query starts on the first checkpoint. Queries whose confidence is
+    below CONFIDENCE_THRESHOLD are re-run on the next one; the last
+    checkpoint's answer is always accepted.
+    
+    Returns:
+        One dictionary per query with answer coordinates, aggregation index,
+        confidence and the model that produced the answer
+    """
+    predictions: List[Dict[str, Any]] = [None] * len(queries)
+    pending = list(range(len(queries)))
+    
+    for level, model_name in enumerate(CASCADE_MODELS):
+        tokenizer, model = _load_model(model_name)
+        batch = [queries[i] for i in pending]
+        
+        inputs = tokenizer(
+            table=table,
+            queries=batch,
+            padding="max_length",
+            return_tensors="pt",
+            truncation=True
+        )
+        if inputs["input_ids"].shape[1] > MAX_TOKENS:
+            raise TokenLimitError("Input exceeds token limit.")
+        
+        with torch.no_grad():
+            outputs = model(**inputs)
+        coordinates, aggregation_indices = tokenizer.convert_logits_to_predictions(
+            inputs,
+            outputs.logits.detach().cpu().numpy(),
+            outputs.logits_aggregation.detach().cpu().numpy()
+        )
+        
+        is_last = level == len(CASCADE_MODELS) - 1
+        escalated = []
+        for j, i in enumerate(pending):
+            confidence = _confidence(inputs, outputs, j)
+            if confidence < CONFIDENCE_THRESHOLD and not is_last:
+                escalated.append(i)
+                continue
+            predictions[i] = {
+                "coordinates": coordinates[j],
+                "aggregation_index": int(aggregation_indices[j]),
+                "confidence": confidence,
+                "model": model_name
+            }
+            _metrics["answered_by"][model_name] += 1
+        
+        _metrics["escalations"] += len(escalated)
+        pending = escalated
+        if not pending:
+            break
+    
+    _metrics["queries"] += len(queries)
+    return predictions
+
+def get_metrics() -> Dict[str, Any]:
+    """Return escalation counts and rate since startup."""
+    queries = _metrics["queries"]
+    return {
+        "models": CASCADE_MODELS,
+        "confidence_threshold": CONFIDENCE_THRESHOLD,
+        "queries": queries,
+        "escalations": _metrics["escalations"],
+        "escalation_rate": _metrics["escalations"] / queries if queries else 0.0,
+        "answered_by": dict(_metrics["answered_by"])
+    }
+
+# Load the first checkpoint when the module is imported, as it serves every query
+_load_model(CASCADE_MODELS[0])
@@ -1,17 +1,13 @@
 import pandas as pd
 import re
-from transformers import TapasTokenizer, TapasForQuestionAnswering
 import warnings
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+
+from app.services.model_cascade import predict, TokenLimitError
 
 # Suppress future warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-# Load model once when the module is imported
-model_name = "google/tapas-base-finetuned-wtq"
-tokenizer = TapasTokenizer.from_pretrained(model_name)
-model = TapasForQuestionAnswering.from_pretrained(model_name)
-
 def process_query(query: str, table: pd.DataFrame) -> Dict[str, Any]:
     """
     Process a natural language query against a table.
@@ -23,91 +19,133 @@ def process_query(query: str, table: pd.DataFrame) -> Dict[str, Any]:
     Returns:
         Dictionary with query result information
     """
+    return process_queries([query], table)[0]
+
+def process_queries(queries: List[str], table: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Process several natural language queries against the same table.
+    
+    Queries that go to TAPAS are run through the model cascade as one batch.
+    
+    Args:
+        queries: The natural language query strings
+        table: The pandas DataFrame to query
+        
+    Returns:
+        List of dictionaries with query result information, one per query
+    """
     try:
         if not isinstance(table, pd.DataFrame):
             raise ValueError("Table must be a pandas DataFrame.")
         
-        # Handle 'details' queries by extracting ID from the query
-        if "details" in query.lower():
-            id_value = None
-            # Attempt to extract ID after 'details of' phrase
-            parts = query.lower().split("details of")
-            if len(parts) > 1:
-                id_part = parts[1].strip()
-                id_match = re.search(r'[\w-]+', id_part)
-                if id_match:
-                    id_value = id_match.group()
-            
-            # Fallback: search for any ID-like pattern in the query
-            if not id_value:
-                id_match = re.search(r'\b[\w-]+\b', query)
-                if id_match:
-                    id_value = id_match.group()
-            
-            if not id_value:
-                return {
-                    "success": False,
-                    "message": "Could not find an ID in the query."
-                }
-            
-            id_column = table.columns[0]
-            matching_row = table[table[id_column].str.strip() == str(id_value).strip()]
-            
-            if not matching_row.empty:
-                details = matching_row.iloc[0].to_dict()
-                return {
-                    "success": True,
-                    "result_type": "details",
-                    "result": details
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": f"ID '{id_value}' not found in the table."
-                }
+        # Work on positional rows, but report answers by the caller's row labels
+        # so answers over a row subset map back to the full table
+        row_labels = table.index
+        table = table.reset_index(drop=True)
         
-        # Process other queries with TAPAS
-        inputs = tokenizer(
-            table=table, 
-            queries=query, 
-            padding="max_length", 
-            return_tensors="pt", 
-            truncation=True
-        )
+        results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+        tapas_indices = []
+        for i, query in enumerate(queries):
+            if "details" in query.lower():
+                try:
+                    results[i] = _process_details_query(query, table, row_labels)
+                except Exception as e:
+                    results[i] = {
+                        "success": False,
+                        "message": f"Error processing query: {str(e)}"
+                    }
+            else:
+                tapas_indices.append(i)
         
-        if inputs["input_ids"].shape[1] > 512:
-            return {
-                "success": False,
-                "message": "Error: Input exceeds token limit. Simplify your query or reduce table size."
-            }
+        if not tapas_indices:
+            return results
         
-        outputs = model(**inputs)
-        predicted_answer_coordinates, predicted_aggregation_indices = tokenizer.convert_logits_to_predictions(
-            inputs,
-            outputs.logits.detach().cpu().numpy(), 
-            outputs.logits_aggregation.detach().cpu().numpy()
-        )
+        # Process other queries with the TAPAS model cascade
+        try:
+            predictions = predict(table, [queries[i] for i in tapas_indices])
+        except TokenLimitError:
+            for i in tapas_indices:
+                results[i] = {
+                    "success": False,
+                    "message": "Error: Input exceeds token limit. Simplify your query or reduce table size."
+                }
+            return results
         
-        if not predicted_answer_coordinates[0]:
-            return {
+        for i, prediction in zip(tapas_indices, predictions):
+            results[i] = _answer_from_prediction(prediction, table, row_labels)
+        return results
+    
+    except Exception as e:
+        return [
+            {
                 "success": False,
-                "message": "Answer not found. Please rephrase your query."
+                "message": f"Error processing query: {str(e)}"
             }
-        
-        # Extract answers from the table
-        answers = []
-        for coordinates in predicted_answer_coordinates[0]:
-            row, col = coordinates
-            answers.append(str(table.iloc[row, col]))
-        
+            for _ in queries
+        ]
+
+def _process_details_query(query: str, table: pd.DataFrame, row_labels: pd.Index) -> Dict[str, Any]:
+    """Handle 'details' queries by extracting ID from the query."""
+    id_value = None
+    # Attempt to extract ID after 'details of' phrase
+    parts = query.lower().split("details of")
+    if len(parts) > 1:
+        id_part = parts[1].strip()
+        id_match = re.search(r'[\w-]+', id_part)
+        if id_match:
+            id_value = id_match.group()
+    
+    # Fallback: search for any ID-like pattern in the query
+    if not id_value:
+        id_match = re.search(r'\b[\w-]+\b', query)
+        if id_match:
+            id_value = id_match.group()
+    
+    if not id_value:
         return {
-            "success": True,
-            "result_type": "answer",
-            "result": answers
+            "success": False,
+            "message": "Could not find an ID in the query."
         }
     
-    except Exception as e:
+    id_column = table.columns[0]
+    matching_row = table[table[id_column].str.strip() == str(id_value).strip()]
+    
+    if not matching_row.empty:
+        details = matching_row.iloc[0].to_dict()
+        return {
+            "success": True,
+            "result_type": "details",
+            "result": details,
+            "row_indices": [int(row_labels[matching_row.index[0]])]
+        }
+    else:
+        return {
+            "success": False,
+            "message": f"ID '{id_value}' not found in the table."
+        }
+
+def _answer_from_prediction(prediction: Dict[str, Any], table: pd.DataFrame, row_labels: pd.Index) -> Dict[str, Any]:
+    """Turn a model cascade prediction into a query result."""
+    if not prediction["coordinates"]:
         return {
             "success": False,
-            "message": f"Error processing query: {str(e)}"
-        }
\ No newline at end of file
+            "message": "Answer not found. Please rephrase your query."
+        }
+    
+    # Extract answers from the table
+    answers = []
+    row_indices = []
+    for coordinates in prediction["coordinates"]:
+        row, col = coordinates
+        answers.append(str(table.iloc[row, col]))
+        if int(row_labels[row]) not in row_indices:
+            row_indices.append(int(row_labels[row]))
+    
+    return {
+        "success": True,
+        "result_type": "answer",
+        "result": answers,
+        "row_indices": row_indices,
+        "confidence": prediction["confidence"],
+        "model": prediction["model"]
+    }
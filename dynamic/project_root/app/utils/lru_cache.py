@@ -0,0 +1,25 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class LRUCache(OrderedDict):
+    """Dictionary that evicts its least recently used entries past max_size."""
+
+    def __init__(self, max_size: int):
+        super().__init__()
+        self.max_size = max(1, max_size)
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        if key in self:
+            return self[key]
+        return default
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.max_size:
+            self.popitem(last=False)
@@ -1,5 +1,6 @@
 import pandas as pd
 import os
+import hashlib
 from typing import Optional, Tuple
 
 def load_table_from_csv(file_path: str) -> Optional[pd.DataFrame]:
@@ -18,33 +19,52 @@ def truncate_table(table: pd.DataFrame, max_rows: int = 20, max_columns: int = 5
     """Truncate table to maximum number of rows and columns."""
     return table.iloc[:max_rows, :max_columns]
 
+def compute_content_hash(data: bytes) -> str:
+    """Return the SHA-256 hex digest used to address uploaded file contents."""
+    return hashlib.sha256(data).hexdigest()
+
+def content_path(upload_dir: str, content_hash: str) -> str:
+    """Return the storage path for the upload with the given content hash."""
+    return os.path.join(upload_dir, f"{content_hash}.csv")
+
 def save_uploaded_csv(file, upload_dir: str) -> Tuple[bool, str, Optional[str]]:
     """
-    Save an uploaded CSV file to the upload directory.
+    Save an uploaded CSV file to the upload directory, addressed by content hash.
+    
+    Identical uploads map to the same file, so re-uploading a file that is
+    already stored skips both the write and the validation.
     
     Returns:
-        Tuple of (success, message, file_path)
+        Tuple of (success, message, content_hash)
     """
     try:
         # Ensure upload directory exists
         os.makedirs(upload_dir, exist_ok=True)
         
-        # Generate unique filename
-        file_path = os.path.join(upload_dir, file.filename)
+        data = file.file.read()
+        content_hash = compute_content_hash(data)
+        file_path = content_path(upload_dir, content_hash)
         
-        # Save the file
-        with open(file_path, "wb") as f:
-            f.write(file.file.read())
+        # Identical content was already stored and validated
+        if os.path.exists(file_path):
+            return True, "File uploaded successfully", content_hash
+        
+        # Write to a temporary name first so concurrent uploads of the same
+        # content never observe a partially written file
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
         
         # Validate it's a proper CSV
-        df = pd.read_csv(file_path)
+        df = pd.read_csv(tmp_path)
         if df.empty:
-            os.remove(file_path)
+            os.remove(tmp_path)
             return False, "Uploaded file is empty", None
-            
-        return True, "File uploaded successfully", file_path
+        
+        os.replace(tmp_path, file_path)
+        return True, "File uploaded successfully", content_hash
     except Exception as e:
         # Clean up if file was created
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
-        return False, f"Error processing upload: {str(e)}", None
\ No newline at end of file
+        if 'tmp_path' in locals() and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False, f"Error processing upload: {str(e)}", None
@@ -0,0 +1,192 @@
+"""
+Answer questions over CSV tables in bulk, outside the web server.
+
+Questions are read from a JSONL file, one object per line:
+
+    {"id": "q1", "table": "customers-100.csv", "query": "What is the email for ID 638?"}
+
+Table paths are resolved against the uploads directory unless absolute.
+Results are appended to the output JSONL file as they complete, so an
+interrupted run can be resumed by running the same command again. Only
+successful answers count as done; failed questions are retried on resume
+and their newer records supersede the older ones.
+
+Usage:
+    python batch.py questions.jsonl results.jsonl --workers 4 --batch-size 16
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, List, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rounds of fresh worker pools for batches whose worker crashed
+MAX_ATTEMPTS = 2
+
+# Tables loaded by this worker process, keyed by path
+_worker_tables: Dict[str, Any] = {}
+
+def _init_worker(threads: int):
+    """Split CPU threads between workers so they do not oversubscribe cores."""
+    import torch
+    torch.set_num_threads(threads)
+
+def _answer_batch(table_path: str, questions: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Answer a batch of (id, query) questions against one table in a worker."""
+    # Imported here so the model loads in each worker, not in the parent
+    from app.services.query_service import process_queries
+    from app.utils.table_utils import load_table_from_csv
+    
+    if table_path not in _worker_tables:
+        _worker_tables[table_path] = load_table_from_csv(table_path)
+    table = _worker_tables[table_path]
+    
+    if table is None:
+        results = [
+            {"success": False, "message": "Error loading table from file."}
+            for _ in questions
+        ]
+    else:
+        results = process_queries([query for _, query in questions], table)
+    
+    return [
+        {"id": question_id, "table": table_path, "query": query, **result}
+        for (question_id, query), result in zip(questions, results)
+    ]
+
+def _completed_ids(output_path: str) -> Set[str]:
+    """Return ids a previous run already answered successfully."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                if record.get("success"):
+                    done.add(str(record["id"]))
+            except (ValueError, KeyError, AttributeError):
+                # Partial line from an interrupted run
+                continue
+    return done
+
+def _read_questions(input_path: str, upload_dir: str) -> List[Tuple[str, str, str]]:
+    """Read (id, table_path, query) questions from a JSONL file."""
+    questions = []
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            question_id = str(record.get("id", line_number))
+            table_path = record["table"]
+            if not os.path.isabs(table_path):
+                table_path = os.path.join(upload_dir, table_path)
+            questions.append((question_id, table_path, record["query"]))
+    return questions
+
+def run_batch(input_path: str, output_path: str, upload_dir: str, workers: int, batch_size: int) -> Dict[str, Any]:
+    """
+    Answer every question in input_path not already in output_path.
+    
+    Returns:
+        Dictionary with a throughput summary of the run
+    """
+    start = time.perf_counter()
+    done = _completed_ids(output_path)
+    questions = _read_questions(input_path, upload_dir)
+    
+    # Group pending questions by table so each batch shares one table
+    by_table: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+    skipped = 0
+    for question_id, table_path, query in questions:
+        if question_id in done:
+            skipped += 1
+            continue
+        by_table[table_path].append((question_id, query))
+    
+    batches = [
+        (table_path, pending[i:i + batch_size])
+        for table_path, pending in by_table.items()
+        for i in range(0, len(pending), batch_size)
+    ]
+    
+    # Start the output on a fresh line in case the last run was cut off mid-write
+    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+    
+    answered = 0
+    failed = 0
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with open(output_path, "a", encoding="utf-8") as out:
+        if needs_newline:
+            out.write("\n")
+        
+        # A crashed worker breaks the whole pool, failing every batch still in
+        # it, so those batches are retried once in a fresh pool
+        for attempt in range(MAX_ATTEMPTS):
+            if not batches:
+                break
+            crashed = []
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(threads,)) as executor:
+                futures = {executor.submit(_answer_batch, table_path, batch): (table_path, batch) for table_path, batch in batches}
+                for future in as_completed(futures):
+                    try:
+                        records = future.result()
+                    except Exception as e:
+                        table_path, batch = futures[future]
+                        logger.warning(f"Batch of {len(batch)} questions on {table_path} failed: {e!r}")
+                        crashed.append((table_path, batch))
+                        continue
+                    for record in records:
+                        out.write(json.dumps(record, default=str) + "\n")
+                        if record.get("success"):
+                            answered += 1
+                        else:
+                            failed += 1
+                    out.flush()
+            batches = crashed
+    
+    # Questions in batches that never completed are left out of the output
+    # so a later run retries them
+    unfinished = sum(len(batch) for _, batch in batches)
+    for table_path, batch in batches:
+        logger.error(f"Giving up on {len(batch)} questions on {table_path}: {[question_id for question_id, _ in batch]}")
+    
+    elapsed = time.perf_counter() - start
+    processed = answered + failed
+    return {
+        "processed": processed,
+        "answered": answered,
+        "failed": failed,
+        "unfinished": unfinished,
+        "skipped": skipped,
+        "tables": len(by_table),
+        "elapsed_seconds": round(elapsed, 2),
+        "questions_per_second": round(processed / elapsed, 2) if elapsed > 0 else 0.0
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer questions over CSV tables in bulk.")
+    parser.add_argument("input", help="JSONL file of questions with id, table and query")
+    parser.add_argument("output", help="JSONL file to append results to")
+    parser.add_argument("--upload-dir", default=os.path.join(os.getcwd(), "uploads"),
+                        help="Directory relative table paths are resolved against")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes")
+    parser.add_argument("--batch-size", type=int, default=16,
+                        help="Questions per model forward pass")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    summary = run_batch(args.input, args.output, args.upload_dir, args.workers, args.batch_size)
+    print(json.dumps(summary, indent=2))
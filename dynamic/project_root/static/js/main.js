@@ -10,10 +10,14 @@ document.addEventListener('DOMContentLoaded', () => {
     const queryInput = document.getElementById('query-input');
     const queryStatus = document.getElementById('query-status');
     const queryResult = document.getElementById('query-result');
+    const followUpInput = document.getElementById('follow-up-input');
     
     // Store current file ID
     let currentFileId = null;
     
+    // Session ID used to narrow follow-up queries to the previous answer
+    let sessionId = null;
+    
     // Handle file upload
     uploadForm.addEventListener('submit', async (e) => {
         e.preventDefault();
@@ -49,6 +53,8 @@ document.addEventListener('DOMContentLoaded', () => {
             if (data.success) {
                 showStatus(uploadStatus, data.message, 'success');
                 currentFileId = data.file_id;
+                sessionId = Date.now().toString(36) + Math.random().toString(36).slice(2);
+                followUpInput.checked = false;
                 
                 // Show preview
                 renderTablePreview(data.preview);
@@ -93,7 +99,9 @@ document.addEventListener('DOMContentLoaded', () => {
                 },
                 body: JSON.stringify({
                     query: query,
-                    file_id: currentFileId
+                    file_id: currentFileId,
+                    session_id: sessionId,
+                    follow_up: followUpInput.checked
                 })
             });
             
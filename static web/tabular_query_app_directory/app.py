@@ -1,14 +1,45 @@
 from flask import Flask, render_template, request, jsonify
 from transformers import TapasTokenizer, TapasForQuestionAnswering
 import pandas as pd
+import torch
+import math
+import os
+import random
 import re
+import threading
+import time
+import uuid
 
 app = Flask(__name__)
 
-# Initialize TAPAS model and tokenizer
-model_name = "google/tapas-base-finetuned-wtq"
-tokenizer = TapasTokenizer.from_pretrained(model_name)
-model = TapasForQuestionAnswering.from_pretrained(model_name)
+# TAPAS checkpoints tried in order, cheapest first; low-confidence answers
+# are escalated to the next one. An empty setting uses the default
+default_cascade_models = ["google/tapas-small-finetuned-wtq", "google/tapas-base-finetuned-wtq"]
+cascade_models = [
+    name.strip() for name in os.getenv("TAPAS_CASCADE_MODELS", "").split(",") if name.strip()
+] or default_cascade_models
+confidence_threshold = float(os.getenv("TAPAS_CONFIDENCE_THRESHOLD", "0.7"))
+
+# Loaded TAPAS models and tokenizers, keyed by model name
+loaded_models = {}
+
+# Escalation metrics since startup
+cascade_metrics = {
+    "queries": 0,
+    "escalations": 0,
+    "answered_by": {name: 0 for name in cascade_models}
+}
+
+def load_model(name):
+    if name not in loaded_models:
+        loaded_models[name] = (
+            TapasTokenizer.from_pretrained(name),
+            TapasForQuestionAnswering.from_pretrained(name)
+        )
+    return loaded_models[name]
+
+# Initialize the first TAPAS model and tokenizer; larger ones load on first escalation
+load_model(cascade_models[0])
 
 # Initial table data
 initial_data = {
@@ -24,6 +55,48 @@ initial_data = {
 # Global table variable that will be modified throughout the session
 current_table = pd.DataFrame.from_dict(initial_data)
 
+# Approximate aggregate mode settings
+SAMPLE_SIZE = 10000
+CONFIDENCE_LEVEL = 0.95
+Z_SCORE = 1.96
+
+class ReservoirSample:
+    """Uniform sample of row positions maintained as rows are appended (Algorithm R)."""
+
+    def __init__(self, capacity, seed=None):
+        self.capacity = capacity
+        self.rows_seen = 0
+        self.positions = []
+        self._rng = random.Random(seed)
+
+    def add(self, position):
+        self.rows_seen += 1
+        if len(self.positions) < self.capacity:
+            self.positions.append(position)
+        else:
+            slot = self._rng.randrange(self.rows_seen)
+            if slot < self.capacity:
+                self.positions[slot] = position
+
+    def rebuild(self, num_rows):
+        self.rows_seen = 0
+        self.positions = []
+        for position in range(num_rows):
+            self.add(position)
+
+# Sample of current_table, kept in sync as rows are added
+table_sample = ReservoirSample(SAMPLE_SIZE)
+table_sample.rebuild(len(current_table))
+
+# Guards current_table and table_sample so readers see a matching pair
+table_lock = threading.Lock()
+
+# Results of exact recomputations running in the background, keyed by job id.
+# Finished results are dropped after EXACT_RESULT_TTL seconds
+EXACT_RESULT_TTL = 600
+exact_results = {}
+exact_results_lock = threading.Lock()
+
 # Helper function to parse and execute SQL-like and mathematical queries
 def execute_sql_query(query, table):
     query = query.lower().strip()
@@ -162,16 +235,173 @@ def handle_math_natural_language(query, table):
             return str(pd.to_numeric(table["Age"], errors='coerce').max())
     return None
 
-# Process query using TAPAS model
+# Helper to resolve a column name case-insensitively
+def resolve_column(name, table):
+    for column in table.columns:
+        if column.lower() == name.strip().lower():
+            return column
+    return None
+
+# Words that can appear in a table-wide sum/avg question without narrowing it
+AGGREGATE_FILLER_WORDS = {
+    "what", "whats", "is", "are", "the", "a", "an", "of", "all", "in", "table",
+    "total", "sum", "average", "avg", "number", "value", "values", "give", "me",
+    "show", "tell", "calculate", "compute", "find", "overall"
+}
+
+# Detect table-wide sum/avg/count questions that approximate mode can answer from a sample
+def detect_aggregate(query, table):
+    query = query.lower().strip()
+
+    sql_match = re.match(r"select\s+(sum|avg|count)\s*\((.+?)\)\s*(?:as\s+\w+\s*)?$", query)
+    if sql_match:
+        operation, column = sql_match.groups()
+        column = resolve_column(column, table)
+        return (operation, column) if column else None
+
+    # Natural language: only the sum/avg phrasings handle_math_natural_language answers
+    if re.search(r"\b(total|sum)\b", query):
+        operation = "sum"
+    elif re.search(r"\b(average|avg)\b", query):
+        operation = "avg"
+    else:
+        return None
+
+    # Pick the column sharing the most words with the query, preferring the
+    # one named first on ties ("average age of actors" is about Age)
+    query_tokens = re.findall(r"\w+", query)
+    query_words = set(query_tokens)
+    column_words = {}
+    for column in table.columns:
+        column_words[column] = {w for w in re.findall(r"\w+", column.lower()) if len(w) > 2}
+    best_column, best_score = None, (0, 0)
+    for column, words in column_words.items():
+        matched = words & query_words
+        if not matched:
+            continue
+        score = (len(matched), -min(query_tokens.index(w) for w in matched))
+        if score > best_score:
+            best_column, best_score = column, score
+    if not best_column:
+        return None
+
+    # Any other word may name an entity or a filter ("of Brad Pitt", "American"),
+    # which a table-wide estimate would answer wrongly
+    known_words = AGGREGATE_FILLER_WORDS.union(*column_words.values())
+    if query_words - known_words:
+        return None
+    return (operation, best_column)
+
+# Helper to mark which values a count includes, using numeric coercion only for numeric columns
+def countable_values(values):
+    numeric_values = pd.to_numeric(values, errors='coerce')
+    present = values.notna() & (values.astype(str).str.strip() != '')
+    if numeric_values[present].notna().all():
+        return numeric_values.notna()
+    return present
+
+# Compute an aggregate exactly over the full table
+def exact_aggregate(operation, column, table):
+    if operation == "count":
+        return int(countable_values(table[column]).sum())
+    numeric_col = pd.to_numeric(table[column], errors='coerce')
+    if operation == "sum":
+        return float(numeric_col.sum())
+    return float(numeric_col.mean())
+
+# Estimate an aggregate from sampled row positions with a confidence interval
+def approximate_aggregate(operation, column, table, positions):
+    total_rows = len(table)
+    sampled = table[column].iloc[positions]
+    values = pd.to_numeric(sampled, errors='coerce')
+    sample_size = len(values)
+    if sample_size < 2:
+        return None
+
+    # Finite population correction, since the sample is drawn without replacement
+    fpc = math.sqrt((total_rows - sample_size) / (total_rows - 1))
+
+    if operation == "count":
+        p = float(countable_values(sampled).mean())
+        estimate = p * total_rows
+        margin = Z_SCORE * math.sqrt(p * (1 - p) / sample_size) * fpc * total_rows
+    elif operation == "sum":
+        filled = values.fillna(0)
+        estimate = float(filled.mean()) * total_rows
+        margin = Z_SCORE * float(filled.std()) / math.sqrt(sample_size) * fpc * total_rows
+    else:
+        valid = values.dropna()
+        if len(valid) < 2:
+            return None
+        estimate = float(valid.mean())
+        margin = Z_SCORE * float(valid.std()) / math.sqrt(len(valid)) * fpc
+
+    return {
+        'estimate': estimate,
+        'confidence_interval': [estimate - margin, estimate + margin],
+        'confidence_level': CONFIDENCE_LEVEL,
+        'sample_size': sample_size,
+        'total_rows': total_rows
+    }
+
+# Helper to drop finished exact results older than EXACT_RESULT_TTL
+def prune_exact_results():
+    cutoff = time.time() - EXACT_RESULT_TTL
+    with exact_results_lock:
+        for job_id, job in list(exact_results.items()):
+            if job['finished_at'] is not None and job['finished_at'] < cutoff:
+                del exact_results[job_id]
+
+# Run the exact aggregate in a background thread and return its job id
+def start_exact_recomputation(operation, column, table):
+    prune_exact_results()
+    job_id = str(uuid.uuid4())
+    with exact_results_lock:
+        exact_results[job_id] = {'result': None, 'finished_at': None}
+
+    def run():
+        result = exact_aggregate(operation, column, table)
+        with exact_results_lock:
+            exact_results[job_id] = {'result': result, 'finished_at': time.time()}
+
+    threading.Thread(target=run, daemon=True).start()
+    return job_id
+
+# Score a TAPAS prediction from its cell-selection and aggregation logits
+def prediction_confidence(inputs, outputs):
+    token_type_ids = inputs["token_type_ids"][0]
+    # Table cell tokens have segment id 1 and a row id past the header row
+    cell_mask = (token_type_ids[:, 0] == 1) & (token_type_ids[:, 2] > 0) & (inputs["attention_mask"][0] == 1)
+
+    probs = torch.sigmoid(outputs.logits[0])[cell_mask]
+    selected = probs[probs > 0.5]
+    if selected.numel() == 0:
+        return 0.0
+
+    aggregation_probs = torch.softmax(outputs.logits_aggregation[0], dim=-1)
+    return float(selected.mean() * aggregation_probs.max())
+
+# Process query using TAPAS models, escalating low-confidence answers
 def process_tapas_query(query, table):
-    inputs = tokenizer(
-        table=table,
-        queries=[query],
-        padding="max_length",
-        return_tensors="pt"
-    )
+    cascade_metrics["queries"] += 1
+    for level, name in enumerate(cascade_models):
+        tokenizer, model = load_model(name)
+        inputs = tokenizer(
+            table=table,
+            queries=[query],
+            padding="max_length",
+            return_tensors="pt"
+        )
+
+        with torch.no_grad():
+            outputs = model(**inputs)
+
+        if level < len(cascade_models) - 1 and prediction_confidence(inputs, outputs) < confidence_threshold:
+            cascade_metrics["escalations"] += 1
+            continue
+        cascade_metrics["answered_by"][name] += 1
+        break
 
-    outputs = model(**inputs)
     predicted_answer_coordinates, predicted_aggregation_indices = tokenizer.convert_logits_to_predictions(
         inputs,
         outputs.logits.detach(),
@@ -207,10 +437,29 @@ def query():
     global current_table
     query_text = request.form.get('query', '')
     
+    approximate = request.form.get('approximate', '').lower() in ('1', 'true', 'on')
+    
     # Check if it's an add command
     if query_text.lower() == 'add':
         return jsonify({'result': 'redirect_add'})
     
+    # Answer sum/avg/count from the sample when the table is too large to scan
+    if approximate:
+        # Snapshot the table with its matching sample; add_actor may replace both
+        with table_lock:
+            table = current_table
+            positions = list(table_sample.positions)
+        aggregate = detect_aggregate(query_text, table) if len(table) > SAMPLE_SIZE else None
+        if aggregate:
+            operation, column = aggregate
+            approx = approximate_aggregate(operation, column, table, positions)
+            if approx:
+                response = {'result': str(approx['estimate']), 'query': query_text, 'approximate': True}
+                response.update(approx)
+                if request.form.get('exact_in_background', '').lower() in ('1', 'true', 'on'):
+                    response['exact_job_id'] = start_exact_recomputation(operation, column, table)
+                return jsonify(response)
+    
     # Check if it's an SQL-like or mathematical query
     if query_text.lower().startswith("select"):
         result = execute_sql_query(query_text, current_table)
@@ -250,9 +499,32 @@ def add_actor():
     for column in current_table.columns:
         new_row[column] = request.form.get(column, '')
     
-    current_table = pd.concat([current_table, pd.DataFrame([new_row])], ignore_index=True)
+    with table_lock:
+        current_table = pd.concat([current_table, pd.DataFrame([new_row])], ignore_index=True)
+        table_sample.add(len(current_table) - 1)
     
     return jsonify({'success': True})
 
+@app.route('/metrics/cascade', methods=['GET'])
+def cascade_metrics_view():
+    queries = cascade_metrics["queries"]
+    return jsonify({
+        'models': cascade_models,
+        'confidence_threshold': confidence_threshold,
+        'queries': queries,
+        'escalations': cascade_metrics["escalations"],
+        'escalation_rate': cascade_metrics["escalations"] / queries if queries else 0.0,
+        'answered_by': cascade_metrics["answered_by"]
+    })
+
+@app.route('/query/exact/<job_id>', methods=['GET'])
+def exact_result(job_id):
+    prune_exact_results()
+    with exact_results_lock:
+        job = exact_results.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown or expired job id'}), 404
+    return jsonify({'success': True, 'ready': job['finished_at'] is not None, 'result': job['result']})
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
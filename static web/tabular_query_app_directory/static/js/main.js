@@ -9,7 +9,7 @@ $(document).ready(function() {
         $.ajax({
             url: '/query',
             method: 'POST',
-            data: { query: query },
+            data: { query: query, approximate: $('#approximate-input').is(':checked') },
             success: function(response) {
                 // Display the query and result section
                 $('#results-card').show();
@@ -48,7 +48,13 @@ $(document).ready(function() {
                 } else {
                     // Display text result
                     $('#table-result').hide();
-                    $('#text-result').show().text(response.result);
+                    let text = response.result;
+                    if (response.approximate) {
+                        const [low, high] = response.confidence_interval;
+                        text += ` (approximate, ${response.confidence_level * 100}% CI ${low.toFixed(2)} to ${high.toFixed(2)}, ` +
+                            `sampled ${response.sample_size} of ${response.total_rows} rows)`;
+                    }
+                    $('#text-result').show().text(text);
                 }
                 
                 // Clear the input for the next query